@@ -1,72 +1,180 @@
 #!/usr/bin/env python3
 """Recursively find all git repos and populate cache."""
 
+import argparse
+import io
 import os
 import sys
-import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 
 import populate_git_clone_cache
 
 
-VERBOSE=False
+# Output levels: -q/--quiet shows errors only, -v/--verbose adds verbose messages
+QUIET = 0
+INFO = 1
+VERBOSE = 2
+LEVEL = INFO
+
+SKIP_DIRS = {".git", "node_modules"}
+
+# Serializes writes to the shared log file and stdout from worker threads.
+_log_lock = populate_git_clone_cache.log_lock
 
 
 def info(msg, log_file=None):
+    if LEVEL < INFO:
+        return
+
     formatted = f"[find_and_populate_git_clone_cache][INFO] {msg}";
-    print(formatted)
-    if log_file:
-        log_file.write(formatted + "\n")
+    with _log_lock:
+        print(formatted)
+        if log_file:
+            log_file.write(formatted + "\n")
 
 
 def verbose(msg, log_file=None):
-    if not VERBOSE:
+    if LEVEL < VERBOSE:
         return
 
     formatted = f"[find_and_populate_git_clone_cache][VERBOSE] {msg}";
-    print(formatted)
-    if log_file:
-        log_file.write(formatted + "\n")
+    with _log_lock:
+        print(formatted)
+        if log_file:
+            log_file.write(formatted + "\n")
 
 
 def error(msg, log_file=None):
     formatted = f"[find_and_populate_git_clone_cache][ERROR] {msg}"
-    print(formatted, file=sys.stderr)
-    if log_file:
-        log_file.write(formatted + "\n")
+    with _log_lock:
+        print(formatted, file=sys.stderr)
+        if log_file:
+            log_file.write(formatted + "\n")
+            log_file.flush()
 
 
 def get_log_file(cache_dir):
-    log_path = cache_dir / "find_and_populate_git_clone_cache.log"
-    log_path.parent.mkdir(parents=True, exist_ok=True)
-    return open(log_path, "a", buffering=1)
+    return populate_git_clone_cache.open_log_file(cache_dir / "find_and_populate_git_clone_cache.log")
+
+
+def find_repos(root_dir, one_file_system=False):
+    """Yield git repos under root_dir, without descending into them or following symlinks
+
+    With one_file_system, directories on other devices (mounts) are skipped,
+    like find -xdev.
+    """
+    root_dev = os.stat(root_dir).st_dev if one_file_system else None
+    stack = [str(root_dir)]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        if any(entry.name == ".git" for entry in entries):
+            yield current
+            continue
+        subdirs = [
+            entry for entry in entries
+            if entry.name not in SKIP_DIRS
+            and not entry.is_symlink()
+            and entry.is_dir(follow_symlinks=False)
+        ]
+        if one_file_system:
+            subdirs = [entry for entry in subdirs if _same_device(entry, root_dev)]
+        # Reversed so directories are visited in listing order
+        stack.extend(entry.path for entry in reversed(subdirs))
+
 
+def _same_device(entry, dev):
+    # Not entry.stat(): on Windows its cached result always has st_dev == 0
+    try:
+        return os.lstat(entry.path).st_dev == dev
+    except OSError:
+        return False
+
+
+def dedupe_by_origin(repos, real_git, log_file=None):
+    """Keep only the first repo per origin URL, since they share one cache mirror
 
-def run_populate_git_clone_cache(repo_path, log_file=None):
+    Repos whose origin can't be read are kept, so population reports them.
+    """
+    url_to_repo = {}
+    unique = []
+    for repo in repos:
+        url = populate_git_clone_cache.get_origin_url(repo, real_git)
+        if url is None:
+            unique.append(repo)
+            continue
+        if url in url_to_repo:
+            verbose(f"Skipping {repo}: same origin as {url_to_repo[url]} ({url})", log_file)
+            continue
+        url_to_repo[url] = repo
+        unique.append(repo)
+    return unique
+
+
+def run_populate_git_clone_cache(repo_path, real_git, cache_dir, directory, log_file=None,
+                                 fetch_times=None, fetch_ttl=0):
     info_msg = f"Populating git clone cache for repo: {repo_path}"
     info(info_msg, log_file)
+    # Buffer this repo's log lines so concurrent workers don't interleave in
+    # the shared log; they are written out in one piece when the repo is done.
+    repo_log = populate_git_clone_cache.LogWriter(io.BytesIO())
     try:
-        process = subprocess.Popen(
-            [sys.executable, "-m", "populate_git_clone_cache", str(repo_path)],
-            stdout=sys.stdout,
-            stderr=sys.stderr,
-            text=True
-        )
-        returncode = process.wait()
-        if returncode == 0:
+        try:
+            succeeded = populate_git_clone_cache.process_target(
+                repo_path, real_git, cache_dir, directory,
+                log_file=repo_log,
+                fetch_times=fetch_times, fetch_ttl=fetch_ttl
+            )
+        finally:
+            # Before the summary line below, so the log reads in order
+            if log_file:
+                with _log_lock:
+                    log_file.write_bytes(repo_log.raw.getvalue())
+        if succeeded:
             info(f"Successfully populated cache for {repo_path}", log_file)
         else:
-            error(f"Failed to populate cache for {repo_path}. Return code: {returncode}", log_file)
+            error(f"Failed to populate cache for {repo_path}", log_file)
     except Exception as e:
         error(f"Exception while populating cache for {repo_path}: {e}", log_file)
 
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Recursively find all git repos and populate cache."
+    )
+    parser.add_argument("root_dir", nargs="?", help="directory to search")
+    parser.add_argument(
+        "--one-file-system", action="store_true",
+        help="don't descend into directories on other filesystems"
+    )
+    level = parser.add_mutually_exclusive_group()
+    level.add_argument(
+        "-q", "--quiet", dest="level", action="store_const", const=QUIET,
+        help="only report errors"
+    )
+    level.add_argument(
+        "-v", "--verbose", dest="level", action="store_const", const=VERBOSE,
+        help="also report verbose diagnostics"
+    )
+    parser.set_defaults(level=INFO)
+    return parser.parse_args(argv)
+
+
 def main():
-    if len(sys.argv) < 2:
-        error("Usage: find-and-populate-git-cache /path/to/search")
+    global LEVEL
+    args = parse_args()
+    LEVEL = populate_git_clone_cache.LEVEL = args.level
+    if not args.root_dir:
+        error("Usage: find-and-populate-git-cache [--one-file-system] /path/to/search")
         sys.exit(1)
 
-    root_dir = Path(sys.argv[1]).resolve()
+    root_dir = Path(args.root_dir).resolve()
 
     if not root_dir.is_dir():
         error(f"ERROR: Not a directory: {root_dir}")
@@ -77,32 +185,57 @@ def main():
     )
     log_file = get_log_file(cache_dir)
 
+    real_git = populate_git_clone_cache.get_real_git()
+    if not real_git:
+        error("Could not find git binary", log_file)
+        sys.exit(1)
+    verbose(f"real_git resolved to: {real_git}", log_file)
+
     info(f"Searching for git repos in: {root_dir}", log_file)
 
     repos = []
-    for root, dirs, files in os.walk(root_dir, followlinks=False):
-        if '.git' in dirs:
-            found = Path(root) / '.git'
-            info(f"Found git repo: {found}", log_file)
-            repos.append(root)
-        dirs[:] = [
-            d for d in dirs
-            if d not in {".git", "node_modules"}
-            and not os.path.islink(os.path.join(root, d))
-        ]
-        if '.git' in dirs:
-            found = Path(root) / '.git'
-            info(f"Found git repo: {found}", log_file)
-            repos.append(root)
+    for repo in find_repos(root_dir, one_file_system=args.one_file_system):
+        info(f"Found git repo: {Path(repo) / '.git'}", log_file)
+        repos.append(repo)
 
     if not repos:
         error("No git repos found", log_file)
         sys.exit(1)
 
-    info(f"Found {len(repos)} repo(s), populating cache...", log_file)
-
-    for repo in repos:
-        run_populate_git_clone_cache(repo, log_file=log_file)
+    unique_repos = dedupe_by_origin(repos, real_git, log_file)
+    info(f"Found {len(repos)} repo(s) ({len(unique_repos)} unique by origin), populating cache...", log_file)
+    repos = unique_repos
+
+    directory = populate_git_clone_cache.load_directory_json(cache_dir, log_file)
+    loaded_directory = dict(directory)
+    fetch_times = populate_git_clone_cache.load_fetch_times(cache_dir, log_file)
+    loaded_fetch_times = dict(fetch_times)
+
+    # Population is dominated by git network/disk I/O, so overlap it with threads.
+    max_workers = min(len(repos), (os.cpu_count() or 1) * 2)
+    verbose(f"Using {max_workers} worker(s)", log_file)
+    # Progress from concurrent clones/fetches would garble the terminal
+    populate_git_clone_cache.PROGRESS = LEVEL >= INFO and sys.stderr.isatty() and max_workers == 1
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        populate = partial(
+            run_populate_git_clone_cache,
+            real_git=real_git,
+            cache_dir=cache_dir,
+            directory=directory,
+            log_file=log_file,
+            fetch_times=fetch_times,
+            fetch_ttl=populate_git_clone_cache.get_fetch_ttl(),
+        )
+        list(executor.map(populate, repos))
+
+    if directory != loaded_directory:
+        populate_git_clone_cache.write_directory_json(cache_dir, directory, log_file)
+    fetched = {
+        url: last_fetched for url, last_fetched in fetch_times.items()
+        if loaded_fetch_times.get(url) != last_fetched
+    }
+    if fetched:
+        populate_git_clone_cache.write_fetch_times(cache_dir, fetched, directory, log_file)
 
     info("Done.", log_file)
     log_file.write("Done.\n")
@@ -2,42 +2,81 @@
 
 import os
 import sys
+import argparse
+import atexit
+import configparser
+import functools
 import hashlib
 import subprocess
 import shutil
+import sqlite3
+import threading
+import time
 from pathlib import Path
 import json
 
 
-VERBOSE=False
+# Output levels: -q/--quiet shows errors only, -v/--verbose adds verbose messages
+QUIET = 0
+INFO = 1
+VERBOSE = 2
+LEVEL = INFO
+
+# git only reports clone/fetch progress to a terminal, and its stderr is a pipe
+# here; main() sets this when progress should be requested explicitly.
+PROGRESS = False
+
+# Saved in new mirrors' config so the clone wrappers' "fetch --all" fetches this
+# many remotes (e.g. aliases added by git-clone-cache-alias) at once.
+FETCH_PARALLEL = os.cpu_count() or 1
+
+# Serializes console and log output; shared with callers that run
+# process_target() from several threads.
+log_lock = threading.Lock()
+
+# Guards directory.json and the per-mirror locks when called from threads.
+_directory_json_lock = threading.Lock()
+_mirror_locks = {}
+_mirror_locks_lock = threading.Lock()
 
 
 def info(msg, log_file=None):
+    if LEVEL < INFO:
+        return
+
     formatted = f"[populate_git_clone_cache][INFO] {msg}";
-    print(formatted)
-    if log_file:
-        log_file.write(formatted + "\n")
+    with log_lock:
+        print(formatted)
+        if log_file:
+            log_file.write(formatted + "\n")
 
 
 def verbose(msg, log_file=None):
-    if not VERBOSE:
+    if LEVEL < VERBOSE:
         return
 
     formatted = f"[populate_git_clone_cache][VERBOSE] {msg}";
-    print(formatted)
-    if log_file:
-        log_file.write(formatted + "\n")
+    with log_lock:
+        print(formatted)
+        if log_file:
+            log_file.write(formatted + "\n")
 
 
 def error(msg, log_file=None):
     formatted = f"[populate_git_clone_cache][ERROR] {msg}";
-    print(formatted, file=sys.stderr)
-    if log_file:
-        log_file.write(formatted + "\n")
+    with log_lock:
+        print(formatted, file=sys.stderr)
+        if log_file:
+            log_file.write(formatted + "\n")
+            log_file.flush()
 
 
+@functools.lru_cache(maxsize=1)
 def find_real_git():
-    """Find the real git binary, skipping the wrapper at ~/bin/git"""
+    """Find the real git binary, skipping the wrapper at ~/bin/git
+
+    The result is cached for the life of the process.
+    """
     exe_name = "git" + (".exe" if os.name == "nt" else "")
     wrapper_path = Path(__file__).parent / "out" / exe_name
     verbose(f"Wrapper path: {wrapper_path}")
@@ -53,15 +92,41 @@ def find_real_git():
     return None
 
 
+def get_real_git():
+    """Return the real git binary if it is executable, else None
+
+    Resolved once per process; callers resolve it up front and pass it down
+    to populate_cache(), process_target(), etc.
+    """
+    real_git = find_real_git()
+    if real_git and os.access(real_git, os.X_OK):
+        return real_git
+    return None
+
+
 def get_origin_url(repo_path, real_git):
-    """Extract origin URL from a local git repo"""
-    info(f"Getting origin URL for repo: {repo_path}")
+    """Extract origin URL from a local git repo
+
+    Results are cached per resolved repo path for the life of the process.
+    """
+    return _get_origin_url(os.path.realpath(repo_path), real_git)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_origin_url(repo_path, real_git):
+    verbose(f"Getting origin URL for repo: {repo_path}")
+    url = read_origin_url(repo_path)
+    if url:
+        verbose(f"Read origin URL from git config: {url}")
+        return url
+    # Fall back to git for configs we don't parse (e.g. [include]d files)
     try:
         result = subprocess.run(
-            [real_git, "-C", str(repo_path), "remote", "get-url", "origin"],
+            [real_git, "-C", repo_path, "config", "--get", "remote.origin.url"],
             capture_output=True,
             text=True,
-            check=False
+            check=False,
+            close_fds=(os.name == "nt")  # allows posix_spawn(), see run_git_command
         )
         verbose(f"Command output: {result.stdout.strip()}, returncode: {result.returncode}")
         if result.returncode == 0:
@@ -71,34 +136,133 @@ def get_origin_url(repo_path, real_git):
     return None
 
 
+def _git_config_path(repo_path):
+    """Return the config file of the repo at repo_path, following a .git file"""
+    git_dir = os.path.join(repo_path, ".git")
+    if os.path.isfile(git_dir):
+        # Worktrees and submodules: ".git" holds "gitdir: <path>"
+        with open(git_dir, "r") as f:
+            line = f.readline().strip()
+        if not line.startswith("gitdir:"):
+            return None
+        git_dir = os.path.join(repo_path, line[len("gitdir:"):].strip())
+        # Linked worktrees keep the shared config in the common dir
+        commondir_path = os.path.join(git_dir, "commondir")
+        if os.path.isfile(commondir_path):
+            with open(commondir_path, "r") as f:
+                git_dir = os.path.join(git_dir, f.readline().strip())
+    return os.path.join(git_dir, "config")
+
+
+def read_origin_url(repo_path):
+    """Read remote.origin.url straight from the repo's git config, without spawning git
+
+    Returns None if it can't be determined this way.
+    """
+    try:
+        config_path = _git_config_path(repo_path)
+        if not config_path:
+            return None
+        config = configparser.ConfigParser(strict=False, interpolation=None)
+        if not config.read(config_path):
+            return None
+        url = config.get('remote "origin"', "url", fallback=None)
+    except (OSError, configparser.Error) as e:
+        verbose(f"Could not read git config for {repo_path}: {e}")
+        return None
+    # configparser keeps inline comments and knows nothing of git's quoting
+    # and escapes; leave any value using them to the `git config` fallback
+    if url and any(c.isspace() or c in '"\\#;' for c in url):
+        return None
+    return url or None
+
+
 def compute_cache_key(url):
-    """Compute SHA256 hash of URL"""
-    info(f"Computing cache key for URL: {url}")
+    """Compute SHA256 hash of URL
+
+    This must stay in sync with the clone wrappers (git-clone-cache.sh,
+    git-clone-cache-wrapper.go) and git-clone-cache-alias.sh, which look up
+    mirrors by sha256(url); a different hash would hide the cache from them.
+    """
+    verbose(f"Computing cache key for URL: {url}")
     key = hashlib.sha256(url.encode()).hexdigest()
-    info(f"Cache key: {key}")
+    verbose(f"Cache key: {key}")
     return key
 
 
 def is_local_repo(path):
     """Check if path is a git repository"""
-    path_obj = Path(path)
     verbose(f"Checking if path is a local git repo: {path}")
-    is_repo = path_obj.is_dir() and path_obj.joinpath(".git").exists()
+    is_repo = os.path.isdir(path) and os.path.exists(os.path.join(path, ".git"))
     verbose(f"is_local_repo({path}) = {is_repo}")
     return is_repo
 
 
+def _pump(src, dst, log_file=None, strip_progress=False):
+    """Copy a child's output pipe to dst (if any) and the log in large chunks
+
+    With strip_progress, only the last \r-separated frame of each line (e.g.
+    "Receiving objects: 100% (6/6), done.") goes to the log; dst gets it all.
+    """
+    pending = b""
+    with src:
+        while True:
+            chunk = src.read(65536)
+            if not chunk:
+                break
+            log_chunk = chunk
+            if strip_progress:
+                lines, newline, pending = (pending + chunk).rpartition(b"\n")
+                # A line still in progress only needs its latest frame
+                pending = pending.rsplit(b"\r", 1)[-1]
+                log_chunk = b"".join(
+                    line.rsplit(b"\r", 1)[-1] + b"\n" for line in lines.split(b"\n")
+                ) if newline else b""
+            with log_lock:
+                if dst:
+                    dst.write(chunk)
+                    dst.flush()
+                if log_file and log_chunk:
+                    log_file.write_bytes(log_chunk)
+    if log_file and pending:
+        with log_lock:
+            log_file.write_bytes(pending + b"\n")
+
+
 def run_git_command(cmd, args, log_file=None):
-    """Run a git command and return success status, streaming output to stdout/stderr only"""
+    """Run a git command and return success status, copying its output to stdout/stderr and the log"""
     info_msg = f"Running git command: {cmd} {' '.join(args)}"
     info(info_msg, log_file)
+    process = None
     try:
+        # git's stdout is informational; with --quiet it only goes to the log
+        stdout_dst = sys.stdout.buffer if LEVEL >= INFO else None
+        stderr_dst = sys.stderr.buffer
+        with log_lock:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        # Unbuffered pipes: each read() returns whatever git has written so far,
+        # up to 64 KiB, so output is forwarded in big chunks without stalling.
+        # Pipes (not fds 0-2), an absolute cmd and close_fds=False let CPython
+        # start git with posix_spawn() instead of fork+exec; our own fds are
+        # non-inheritable by default, so nothing leaks into git. Windows has no
+        # posix_spawn(), and there close_fds=False would let concurrent gits
+        # inherit each other's pipe handles, so keep close_fds=True there.
         process = subprocess.Popen(
             [cmd] + args,
-            stdout=sys.stdout,
-            stderr=sys.stderr,
-            text=True
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            bufsize=0,
+            close_fds=(os.name == "nt")
         )
+        pumps = [
+            threading.Thread(target=_pump, args=(process.stdout, stdout_dst, log_file)),
+            threading.Thread(target=_pump, args=(process.stderr, stderr_dst, log_file, PROGRESS)),
+        ]
+        for pump in pumps:
+            pump.start()
+        for pump in pumps:
+            pump.join()
         process.wait()
         if process.returncode == 0:
             verbose("Command succeeded.", log_file)
@@ -108,30 +272,144 @@ def run_git_command(cmd, args, log_file=None):
             error(error_msg, log_file)
             return False
     except Exception as e:
+        if process is not None and process.poll() is None:
+            # Don't leave git running with nobody draining its pipes
+            process.kill()
+            process.wait()
         error_msg = f"Command failed: {e}"
         error(error_msg, log_file)
         return False
 
 
-def update_directory_json(cache_dir, url, cache_key, log_file=None):
-    """Update directory.json mapping URL to cache_key"""
-    directory_json_path = cache_dir / "directory.json"
-    mapping = {}
-    if directory_json_path.exists():
-        try:
-            with open(directory_json_path, "r") as f:
-                mapping = json.load(f)
-        except Exception as e:
-            error(f"Failed to read directory.json: {e}", log_file)
+def _mirror_lock(cache_mirror):
+    """Return the lock serializing work on a single cache mirror
+
+    Keyed on the resolved path: git-clone-cache-alias.sh symlinks alias keys
+    to the canonical mirror, so different cache keys can share one directory.
+    """
+    mirror_path = os.path.realpath(cache_mirror)
+    with _mirror_locks_lock:
+        return _mirror_locks.setdefault(mirror_path, threading.Lock())
+
+
+def _load_json(path, log_file=None):
+    if not path.exists():
+        return {}
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        error(f"Failed to read {path.name}: {e}", log_file)
+        return {}
+
+
+def _write_json(path, mapping, log_file=None):
+    """Merge mapping into the JSON object at path in one atomic replace"""
+    # Other tools (the clone wrappers, alias script) may have added entries
+    # since we loaded the file; keep them.
+    merged = _load_json(path, log_file)
+    merged.update(mapping)
+    tmp_path = path.with_suffix(".json.tmp")
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(merged, f, indent=2, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        # A crash leaves either the old or the new file, never a partial one
+        os.replace(tmp_path, path)
+        _fsync_dir(path.parent)
+        info(f"Updated {path.name} ({len(merged)} entries)", log_file)
+    except Exception as e:
+        error(f"Failed to write {path.name}: {e}", log_file)
+
+
+def _fsync_dir(dir_path):
+    """Make a rename within dir_path durable (no-op where directories can't be opened)"""
+    if os.name == "nt":
+        return
+    fd = os.open(dir_path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def load_directory_json(cache_dir, log_file=None):
+    """Load the directory.json mapping of URL to cache_key"""
+    return _load_json(cache_dir / "directory.json", log_file)
+
+
+def update_directory_json(directory, url, cache_key, log_file=None):
+    """Update the in-memory directory mapping; see write_directory_json"""
     # Idempotent update
-    if mapping.get(url) != cache_key:
-        mapping[url] = cache_key
+    with _directory_json_lock:
+        if directory.get(url) != cache_key:
+            directory[url] = cache_key
+            verbose(f"Recorded {url} -> {cache_key} for directory.json", log_file)
+
+
+def write_directory_json(cache_dir, directory, log_file=None):
+    """Write the directory mapping back to directory.json in one atomic replace"""
+    with _directory_json_lock:
+        _write_json(cache_dir / "directory.json", directory, log_file)
+
+
+def _open_manifest(cache_dir):
+    conn = sqlite3.connect(str(cache_dir / "directory.sqlite"))
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS mapping"
+        " (url TEXT PRIMARY KEY, cache_key TEXT, last_fetched INTEGER)"
+    )
+    return conn
+
+
+def load_fetch_times(cache_dir, log_file=None):
+    """Load the mapping of URL to last successful fetch (epoch seconds)
+
+    Fetch times live in directory.sqlite rather than directory.json, whose
+    URL -> cache_key format is shared with the shell scripts.
+    """
+    try:
+        conn = _open_manifest(cache_dir)
         try:
-            with open(directory_json_path, "w") as f:
-                json.dump(mapping, f, indent=2, sort_keys=True)
-            info(f"Updated directory.json for {url}", log_file)
-        except Exception as e:
-            error(f"Failed to write directory.json: {e}", log_file)
+            return dict(conn.execute(
+                "SELECT url, last_fetched FROM mapping WHERE last_fetched IS NOT NULL"
+            ))
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        error(f"Failed to read directory.sqlite: {e}", log_file)
+        return {}
+
+
+def write_fetch_times(cache_dir, fetch_times, directory, log_file=None):
+    """Upsert fetch_times (only the changed URLs) into directory.sqlite in one transaction"""
+    rows = [(url, directory.get(url), last_fetched) for url, last_fetched in fetch_times.items()]
+    try:
+        conn = _open_manifest(cache_dir)
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO mapping (url, cache_key, last_fetched) VALUES (?, ?, ?)"
+                    " ON CONFLICT(url) DO UPDATE SET"
+                    " cache_key = excluded.cache_key, last_fetched = excluded.last_fetched",
+                    rows
+                )
+        finally:
+            conn.close()
+        info(f"Updated directory.sqlite ({len(rows)} fetch times)", log_file)
+    except sqlite3.Error as e:
+        error(f"Failed to write directory.sqlite: {e}", log_file)
+
+
+def get_fetch_ttl():
+    """Return the GIT_CLONE_CACHE_TTL in seconds; 0 (the default) always fetches"""
+    ttl = os.environ.get("GIT_CLONE_CACHE_TTL", "0")
+    try:
+        return max(int(ttl), 0)
+    except ValueError:
+        error(f"Ignoring invalid GIT_CLONE_CACHE_TTL: {ttl}")
+        return 0
 
 
 def set_origin_url(cache_mirror, real_git, url, log_file=None):
@@ -139,24 +417,45 @@ def set_origin_url(cache_mirror, real_git, url, log_file=None):
     info(f"Setting origin URL for cache mirror: {cache_mirror}", log_file)
     # This is idempotent: setting the same URL repeatedly is safe
     return run_git_command(
-        real_git, ["-C", str(cache_mirror), "remote", "set-url", "origin", url], log_file=log_file
+        real_git, ["-C", os.fspath(cache_mirror), "remote", "set-url", "origin", url], log_file=log_file
     )
 
 
-def populate_cache(url, cache_mirror, real_git, source_for_clone, cache_dir, log_file=None):
-    """Create or update a cache entry and update directory.json"""
+def _progress_args():
+    return ["--progress"] if PROGRESS else []
+
+
+def populate_cache(url, cache_mirror, real_git, source_for_clone, directory, log_file=None,
+                   fetch_times=None, fetch_ttl=0):
+    """Create or update a cache entry and update directory.json
+
+    fetch_times is the mapping from load_fetch_times(); when given, successful
+    clones/fetches are recorded in it and mirrors fetched less than fetch_ttl
+    seconds ago are not fetched again.
+    """
     verbose(f"populate_cache called with url={url}, cache_mirror={cache_mirror}, source_for_clone={source_for_clone}", log_file)
-    if cache_mirror.exists():
+    mirror_path = str(cache_mirror)
+    if os.path.exists(mirror_path):
+        last_fetched = fetch_times.get(url) if fetch_times is not None else None
+        if last_fetched is not None and time.time() - last_fetched < fetch_ttl:
+            info(f"Up to date (fetched {int(time.time() - last_fetched)}s ago): {url}", log_file)
+            update_directory_json(directory, url, cache_mirror.name, log_file=log_file)
+            return True
         info(f"Updating: {url}", log_file)
         verbose(f"Cache mirror exists: {cache_mirror}", log_file)
+        # Ensure origin URL is correct (idempotent) before fetching from it
+        set_origin_url(mirror_path, real_git, url, log_file=log_file)
+        # No --prune: origin's mirror refspec (+refs/*:refs/*) would delete the
+        # refs/remotes/alias-*/* refs fetched from git-clone-cache-alias remotes
         updated = run_git_command(
-            real_git, ["-C", str(cache_mirror), "fetch", "--all"], log_file=log_file
+            real_git, ["-C", mirror_path, "fetch"] + _progress_args() + ["origin"],
+            log_file=log_file
         )
-        # Ensure origin URL is correct (idempotent)
-        set_origin_url(cache_mirror, real_git, url, log_file=log_file)
-        update_directory_json(cache_dir, url, cache_mirror.name, log_file=log_file)
+        update_directory_json(directory, url, cache_mirror.name, log_file=log_file)
         if updated:
             verbose("  -> OK", log_file)
+            if fetch_times is not None:
+                fetch_times[url] = int(time.time())
             return True
         else:
             error(f"Failed to update cache for {url}", log_file)
@@ -164,33 +463,140 @@ def populate_cache(url, cache_mirror, real_git, source_for_clone, cache_dir, log
     else:
         info(f"Caching: {url}", log_file)
         verbose(f"Cache mirror does not exist, cloning to: {cache_mirror}", log_file)
+        # -c on clone is saved in the mirror's config, so later fetches by the
+        # clone wrappers run in parallel too.
+        clone_args = ["clone", "--mirror", "-c", f"fetch.parallel={FETCH_PARALLEL}"] + _progress_args()
         cloned = run_git_command(
-            real_git, ["clone", "--mirror", source_for_clone, str(cache_mirror)], log_file=log_file
+            real_git, clone_args + [source_for_clone, mirror_path], log_file=log_file
         )
         if cloned:
             info(f"  -> {cache_mirror}", log_file)
             # Set origin URL to the actual remote URL (idempotent)
-            set_origin_url(cache_mirror, real_git, url, log_file=log_file)
-            update_directory_json(cache_dir, url, cache_mirror.name, log_file=log_file)
+            set_origin_url(mirror_path, real_git, url, log_file=log_file)
+            update_directory_json(directory, url, cache_mirror.name, log_file=log_file)
+            if fetch_times is not None:
+                fetch_times[url] = int(time.time())
             return True
         else:
             error(f"Failed to cache {url}", log_file)
             return False
 
 
-def get_log_file(cache_dir):
-    """Return a file object for logging, opened in append mode."""
-    log_path = cache_dir / "populate_git_clone_cache.log"
+def process_target(arg, real_git, cache_dir, directory, log_file=None,
+                   fetch_times=None, fetch_ttl=0):
+    """Populate the cache for one local repo path or URL; return success status
+
+    directory (and fetch_times, if given) are the mappings from
+    load_directory_json() and load_fetch_times(); the caller writes them back
+    with write_directory_json() and write_fetch_times() once all targets are
+    processed.
+    """
+    verbose(f"Processing argument: {arg}")
+
+    if not os.path.exists(arg):
+        error(f"Path does not exist: {arg}", log_file)
+        return False
+
+    if is_local_repo(arg):
+        verbose(f"Argument is a local repo: {arg}")
+        url = get_origin_url(arg, real_git)
+        if not url:
+            error(f"WARNING: No origin remote in {arg}, skipping", log_file)
+            return False
+        source_for_clone = arg
+    elif os.path.isdir(arg):
+        error(f"Not a git repo: {arg}", log_file)
+        verbose(f"Argument is a directory but not a git repo: {arg}", log_file)
+        return False
+    else:
+        verbose(f"Argument is treated as URL: {arg}")
+        url = arg
+        source_for_clone = url
+
+    cache_key = compute_cache_key(url)
+    cache_mirror = cache_dir / cache_key
+    verbose(f"Cache mirror path: {cache_mirror}")
+
+    # Different paths, URLs or alias keys may all resolve to the same mirror
+    with _mirror_lock(cache_mirror):
+        return populate_cache(
+            url, cache_mirror, real_git, source_for_clone, directory,
+            log_file=log_file,
+            fetch_times=fetch_times, fetch_ttl=fetch_ttl
+        )
+
+
+class LogWriter:
+    """Block-buffered UTF-8 text writer over a binary file.
+
+    Log lines are only pushed to the OS when the buffer fills, on flush() (which
+    error() calls), and at exit for log files from open_log_file(), instead of
+    one write() per line.
+    """
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def write(self, text):
+        self.raw.write(text.encode("utf-8"))
+
+    def write_bytes(self, data):
+        self.raw.write(data)
+
+    def flush(self):
+        if not self.raw.closed:
+            self.raw.flush()
+
+    def close(self):
+        atexit.unregister(self.flush)
+        self.raw.close()
+
+
+def open_log_file(log_path):
+    """Open log_path for appending through a 64 KiB LogWriter"""
     # Ensure the parent directory exists
     log_path.parent.mkdir(parents=True, exist_ok=True)
-    return open(log_path, "a", buffering=1)  # line-buffered
+    log_file = LogWriter(open(log_path, "ab", buffering=65536))
+    atexit.register(log_file.flush)
+    return log_file
+
+
+def get_log_file(cache_dir):
+    """Return a file object for logging, opened in append mode."""
+    return open_log_file(cache_dir / "populate_git_clone_cache.log")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Populate/update git clone cache from local repos or URLs."
+    )
+    parser.add_argument(
+        "targets", nargs="*", metavar="TARGET",
+        help="local git repo or URL to cache"
+    )
+    level = parser.add_mutually_exclusive_group()
+    level.add_argument(
+        "-q", "--quiet", dest="level", action="store_const", const=QUIET,
+        help="only report errors"
+    )
+    level.add_argument(
+        "-v", "--verbose", dest="level", action="store_const", const=VERBOSE,
+        help="also report verbose diagnostics"
+    )
+    parser.set_defaults(level=INFO)
+    return parser.parse_args(argv)
 
 
 def main():
+    global LEVEL, PROGRESS
+    args = parse_args()
+    LEVEL = args.level
+    # Targets are processed one at a time, so progress output can't interleave
+    PROGRESS = LEVEL >= INFO and sys.stderr.isatty()
     verbose("Script started.")
-    real_git = find_real_git()
+    real_git = get_real_git()
     info(f"real_git resolved to: {real_git}")
-    if not real_git or not os.access(real_git, os.X_OK):
+    if not real_git:
         error("Could not find git binary")
         error("Exiting due to missing git binary.")
         sys.exit(1)
@@ -207,7 +613,7 @@ def main():
     # Open log file for the duration of the script
     log_file = get_log_file(cache_dir)
 
-    if len(sys.argv) < 2:
+    if not args.targets:
         prog_name = Path(sys.argv[0]).name
         error(
             f"Usage: {prog_name} /path/to/repo1 [/path/to/repo2 ...] "
@@ -217,35 +623,27 @@ def main():
         log_file.write("Exiting due to missing arguments.\n")
         sys.exit(1)
 
-    for arg in sys.argv[1:]:
-        verbose(f"Processing argument: {arg}")
-        arg_path = Path(arg)
-
-        if not arg_path.exists():
-            error(f"Path does not exist: {arg}", log_file)
-            continue
-
-        if is_local_repo(arg):
-            verbose(f"Argument is a local repo: {arg}")
-            url = get_origin_url(arg_path, real_git)
-            if not url:
-                error(f"WARNING: No origin remote in {arg}, skipping", log_file)
-                continue
-            source_for_clone = arg
-        elif arg_path.is_dir():
-            error(f"Not a git repo: {arg}", log_file)
-            verbose(f"Argument is a directory but not a git repo: {arg}", log_file)
-            continue
-        else:
-            verbose(f"Argument is treated as URL: {arg}")
-            url = arg
-            source_for_clone = url
-
-        cache_key = compute_cache_key(url)
-        cache_mirror = cache_dir / cache_key
-        verbose(f"Cache mirror path: {cache_mirror}")
+    directory = load_directory_json(cache_dir, log_file)
+    loaded_directory = dict(directory)
+    fetch_times = load_fetch_times(cache_dir, log_file)
+    loaded_fetch_times = dict(fetch_times)
+    fetch_ttl = get_fetch_ttl()
+    # The same target given twice (e.g. overlapping shell globs) is only processed once
+    for arg in dict.fromkeys(args.targets):
+        process_target(
+            arg, real_git, cache_dir, directory,
+            log_file=log_file,
+            fetch_times=fetch_times, fetch_ttl=fetch_ttl
+        )
 
-        populate_cache(url, cache_mirror, real_git, source_for_clone, cache_dir, log_file=log_file)
+    if directory != loaded_directory:
+        write_directory_json(cache_dir, directory, log_file)
+    fetched = {
+        url: last_fetched for url, last_fetched in fetch_times.items()
+        if loaded_fetch_times.get(url) != last_fetched
+    }
+    if fetched:
+        write_fetch_times(cache_dir, fetched, directory, log_file)
 
     info("Done.", log_file)
     verbose("Script finished.", log_file)